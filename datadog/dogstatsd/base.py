@@ -8,6 +8,8 @@
 DogStatsd is a Python client for DogStatsd, a Statsd fork for Datadog.
 """
 # Standard libraries
+from collections import deque
+from copy import deepcopy
 from random import random
 import logging
 import os
@@ -17,7 +19,12 @@ import threading
 import time
 from threading import Lock, RLock
 
-from typing import Optional, List, Text, Union
+try:
+    from time import monotonic  # type: ignore[attr-defined]
+except ImportError:
+    from time import time as monotonic
+
+from typing import Deque, Dict, Optional, List, Text, Tuple, Union
 
 # Datadog libraries
 from datadog.dogstatsd.context import (
@@ -26,8 +33,9 @@ from datadog.dogstatsd.context import (
 )
 from datadog.dogstatsd.route import get_default_route
 from datadog.dogstatsd.container import ContainerID
-from datadog.util.compat import is_p3k, text
-from datadog.util.format import normalize_tags
+from datadog.dogstatsd.sendmmsg import SENDMMSG_MAX_BATCH, is_sendmmsg_supported, sendmmsg
+from datadog.util.compat import conditional_lru_cache, text
+from datadog.util.format import _normalize_tags
 from datadog.version import __version__
 
 # Logging
@@ -49,6 +57,8 @@ ENTITY_ID_ENV_VAR = "DD_ENTITY_ID"
 
 # Env var to enable/disable sending the container ID field
 ORIGIN_DETECTION_ENABLED = "DD_ORIGIN_DETECTION_ENABLED"
+# Values of DD_ORIGIN_DETECTION_ENABLED that disable origin detection
+ORIGIN_DETECTION_DISABLED_VALUES = frozenset(("no", "false", "0", "n", "off"))
 
 # Default buffer settings based on socket type
 UDP_OPTIMAL_PAYLOAD_LENGTH = 1432
@@ -56,6 +66,27 @@ UDS_OPTIMAL_PAYLOAD_LENGTH = 8192
 
 # Socket options
 MIN_SEND_BUFFER_SIZE = 32 * 1024
+# Send buffer sizes tried in turn for UDP sockets: a larger buffer absorbs
+# bursts of metrics that would otherwise be dropped with ENOBUFS/EAGAIN.
+# Linux caps the value to `net.core.wmem_max`, other platforms (e.g. MacOS)
+# reject sizes above their own limit.
+UDP_SEND_BUFFER_SIZES = (2 * 1024 * 1024, 512 * 1024, 128 * 1024, MIN_SEND_BUFFER_SIZE)
+
+# Maximum size of an event payload, in bytes
+MAX_EVENT_SIZE = 8 * 1024
+# Size of the smallest event header and separator: "_e{1,1}:" and "|"
+MIN_EVENT_OVERHEAD = 9
+
+# Socket errors after which the packet is dropped but the socket kept, with
+# the message they are logged with
+DROPPED_PACKET_ERRORS = {
+    errno.EAGAIN: "Socket send would block: %s, dropping the packet",
+    errno.ENOBUFS: "Socket buffer full: %s, dropping the packet",
+    errno.EMSGSIZE: "Packet size too big (size: %d): %s, dropping the packet",
+}
+
+# Maximum number of distinct tag lists whose serialized form is cached per client
+MAX_TAG_CACHE_SIZE = 1024
 
 # Mapping of each "DD_" prefixed environment variable to a specific tag name
 DD_ENV_TAGS_MAPPING = {
@@ -68,29 +99,87 @@ DD_ENV_TAGS_MAPPING = {
 # Telemetry minimum flush interval in seconds
 DEFAULT_TELEMETRY_MIN_FLUSH_INTERVAL = 10
 
-# Telemetry pre-computed formatting string. Pre-computation
-# increases throughput of composing the result by 2-15% from basic
-# '%'-based formatting with a `join`.
-TELEMETRY_FORMATTING_STR = "\n".join(
-    [
-        "datadog.dogstatsd.client.metrics:%s|c|#%s",
-        "datadog.dogstatsd.client.events:%s|c|#%s",
-        "datadog.dogstatsd.client.service_checks:%s|c|#%s",
-        "datadog.dogstatsd.client.bytes_sent:%s|c|#%s",
-        "datadog.dogstatsd.client.bytes_dropped:%s|c|#%s",
-        "datadog.dogstatsd.client.packets_sent:%s|c|#%s",
-        "datadog.dogstatsd.client.packets_dropped:%s|c|#%s",
-    ]
-) + "\n"
-
 
+def _get_env_tags():
+    # type: () -> Tuple[Tuple[str, ...], bool]
+    """
+    Return the global tags configured through environment variables, and
+    whether the entity ID is one of them.
+    """
+    return _parse_env_tags(
+        os.environ.get("DATADOG_TAGS", ""),
+        tuple(os.environ.get(var, "") for var in DD_ENV_TAGS_MAPPING),
+    )
+
+
+@conditional_lru_cache
+def _parse_env_tags(datadog_tags, dd_env_values):
+    # type: (str, Tuple[str, ...]) -> Tuple[Tuple[str, ...], bool]
+    # The result only depends on the values of the environment variables, so
+    # it's cached for processes that create many clients.
+    env_tags = [tag for tag in datadog_tags.split(",") if tag]
+    # Inject values of DD_* environment variables as global tags.
+    has_entity_id = False
+    for (var, tag_name), value in zip(DD_ENV_TAGS_MAPPING.items(), dd_env_values):
+        if value:
+            env_tags.append(tag_name + ":" + value)
+            if var == ENTITY_ID_ENV_VAR:
+                has_entity_id = True
+    return tuple(env_tags), has_entity_id
+
+
+@conditional_lru_cache
 def addressfamily(hostname, port):
     # type: (str, int) -> socket.AddressFamily
     if not isinstance(hostname, str):
         return socket.AF_INET
 
-    # sort to prefer IPv4 address family for backwards compatibility
-    return sorted(i[0] for i in socket.getaddrinfo(hostname, port))[0]
+    # prefer IPv4 address family for backwards compatibility
+    return min(i[0] for i in socket.getaddrinfo(hostname, port))
+
+
+class _ConstantTags(list):
+    """
+    The constant tags of a client. The client caches them in serialized form,
+    so the cache is refreshed whenever the list is modified in place, e.g.
+    `statsd.constant_tags.append("tag:value")`.
+    """
+
+    def __init__(self, tags, on_change):
+        super(_ConstantTags, self).__init__(tags)
+        self._on_change = on_change
+
+    # Copies and pickles are plain lists, detached from the client
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(list(self), memo)
+
+    def __reduce_ex__(self, protocol):
+        return (list, (list(self),))
+
+
+def _refreshing(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._on_change()
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+# `clear`, `__setslice__` and `__delslice__` only exist on some Python versions
+for _name in (
+    "__delitem__", "__delslice__", "__iadd__", "__imul__", "__setitem__", "__setslice__",
+    "append", "clear", "extend", "insert", "pop", "remove", "reverse", "sort",
+):
+    if hasattr(list, _name):
+        setattr(_ConstantTags, _name, _refreshing(_name))
+del _name
 
 
 # pylint: disable=useless-object-inheritance,too-many-instance-attributes
@@ -98,6 +187,72 @@ def addressfamily(hostname, port):
 class DogStatsd(object):
     OK, WARNING, CRITICAL, UNKNOWN = (0, 1, 2, 3)
 
+    # Instance attributes are stored in slots for faster access and a smaller
+    # footprint. `__dict__` is kept so that instances can still be patched,
+    # e.g. `mock.patch.object(statsd, "increment")`, but it's only allocated
+    # when such an attribute is set.
+    __slots__ = (
+        "__dict__",
+        "__weakref__",
+        "_agg_counters",
+        "_agg_gauges",
+        "_aggregation",
+        "_always_send_default",
+        "_buffer",
+        "_buffer_lock",
+        "_buffer_size",
+        "_buffering_toggle_lock",
+        "_client_tags",
+        "_constant_tags",
+        "_constant_tags_joined",
+        "_container_id_value",
+        "_container_suffix",
+        "_default_sample_rate",
+        "_default_sample_rate_suffix",
+        "_disable_buffering",
+        "_enabled",
+        "_flush_interval",
+        "_flush_thread",
+        "_flush_thread_stop",
+        "_max_payload_size",
+        "_max_queued_size",
+        "_namespace",
+        "_namespace_prefix",
+        "_next_flush_deadline",
+        "_queue",
+        "_queued_size",
+        "_raw_constant_tags_joined",
+        "_send",
+        "_sendmmsg",
+        "_socket_lock",
+        "_socket_sndbuf",
+        "_tag_cache",
+        "_tagged_event_suffix",
+        "_tagged_metric_suffix",
+        "_telemetry",
+        "_telemetry_flush_interval",
+        "_telemetry_suffix",
+        "_untagged_event_suffix",
+        "_untagged_metric_suffix",
+        "bytes_dropped",
+        "bytes_sent",
+        "encoding",
+        "events_count",
+        "host",
+        "metrics_count",
+        "packets_dropped",
+        "packets_sent",
+        "port",
+        "service_checks_count",
+        "socket",
+        "socket_path",
+        "telemetry_host",
+        "telemetry_port",
+        "telemetry_socket",
+        "telemetry_socket_path",
+        "use_ms",
+    )
+
     def __init__(
         self,
         host=DEFAULT_HOST,                      # type: Text
@@ -119,6 +274,8 @@ class DogStatsd(object):
         max_buffer_len=0,                       # type: int
         container_id=None,                      # type: Optional[Text]
         origin_detection_enabled=True,          # type: bool
+        disable_aggregation=True,               # type: bool
+        socket_sndbuf=None,                     # type: Optional[int]
     ):  # type: (...) -> None
         """
         Initialize a DogStatsd object.
@@ -248,9 +405,23 @@ class DogStatsd(object):
         Default: True.
         More on this: https://docs.datadoghq.com/developers/dogstatsd/?tab=kubernetes#origin-detection-over-udp
         :type origin_detection_enabled: boolean
+
+        :param disable_aggregation: If unset, counters and gauges sharing the same name, tags
+        and sample rate are aggregated client-side and only sent once per flush interval:
+        counters are summed and gauges keep their last value.
+        Default: True.
+        :type disable_aggregation: boolean
+
+        :param socket_sndbuf: Send buffer size (SO_SNDBUF) of the sockets, in bytes. A larger buffer
+        absorbs bursts of metrics which would otherwise be dropped. The kernel may cap it, e.g. to
+        `net.core.wmem_max` on Linux. If unset, UDP sockets use the largest of a few sizes accepted by
+        the platform and UDS sockets a minimum of 32KB.
+        Default: None.
+        :type socket_sndbuf: integer
         """
 
         self._socket_lock = Lock()
+        self._socket_sndbuf = socket_sndbuf
 
         # Check for deprecated option
         if max_buffer_size is not None:
@@ -313,19 +484,23 @@ class DogStatsd(object):
         self.telemetry_socket = None
         self.encoding = "utf-8"
 
+        # init telemetry version
+        self._client_tags = [
+            "client:py",
+            "client_version:" + __version__,
+            "client_transport:" + transport,
+        ]
+
         # Options
-        env_tags = [tag for tag in os.environ.get("DATADOG_TAGS", "").split(",") if tag]
-        # Inject values of DD_* environment variables as global tags.
-        has_entity_id = False
-        for var, tag_name in DD_ENV_TAGS_MAPPING.items():
-            value = os.environ.get(var, "")
-            if value:
-                env_tags.append("{name}:{value}".format(name=tag_name, value=value))
-                if var == ENTITY_ID_ENV_VAR:
-                    has_entity_id = True
+        # Normalized and joined user tags, keyed by the tuple of raw tags
+        self._tag_cache = {}  # type: Dict[Tuple, Text]
+        self._constant_tags_joined = ""
+        self._raw_constant_tags_joined = ""
+        self._container_suffix = ""
+        env_tags, has_entity_id = _get_env_tags()
         if constant_tags is None:
             constant_tags = []
-        self.constant_tags = constant_tags + env_tags
+        self.constant_tags = constant_tags + list(env_tags)
         if namespace is not None:
             namespace = text(namespace)
         self.namespace = namespace
@@ -340,23 +515,35 @@ class DogStatsd(object):
             )
             self._set_container_id(container_id, origin_detection_enabled)
 
-        # init telemetry version
-        self._client_tags = [
-            "client:py",
-            "client_version:{}".format(__version__),
-            "client_transport:{}".format(transport),
-        ]
-        self._reset_telemetry()
         self._telemetry_flush_interval = telemetry_min_flush_interval
         self._telemetry = not disable_telemetry
-        self._last_flush_time = time.time()
+        self._reset_telemetry()
 
-        self._current_buffer_total_size = 0
-        self._buffer = []  # type: List[Text]
-        self._buffer_lock = RLock()
+        # Batch the datagrams of a flush in a single system call where possible
+        self._sendmmsg = is_sendmmsg_supported()
+        # Producers let a batch worth of packets queue up before flushing, a
+        # single packet otherwise. The flush thread still sends smaller
+        # batches every `flush_interval`.
+        self._max_queued_size = self._max_payload_size * (SENDMMSG_MAX_BATCH if self._sendmmsg else 1)
+
+        # Producers queue encoded metrics without taking any lock, appending
+        # to a deque is atomic; a flush drains the queue and assembles the
+        # packets in `_buffer`, which is only accessed while holding
+        # `_buffer_lock`. Packets are assembled as lists of metrics and joined
+        # once full.
+        self._queue = deque()  # type: Deque[bytes]
+        self._queued_size = 0
+        # Nothing acquires this lock reentrantly, so use the cheaper `Lock`
+        self._buffer_lock = Lock()
 
         self._reset_buffer()
 
+        # Client-side aggregation of counters and gauges, keyed by
+        # (metric, tags, sample rate suffix) and guarded by `_buffer_lock`
+        self._aggregation = not disable_aggregation
+        self._agg_counters = {}  # type: Dict[Tuple, float]
+        self._agg_gauges = {}  # type: Dict[Tuple, float]
+
         # This lock is used for all cases where buffering functionality is
         # being toggled (by `open_buffer()`, `close_buffer()`, or
         # `self._disable_buffering` calls).
@@ -373,9 +560,81 @@ class DogStatsd(object):
         # a reasonable range. This both prevents thrashing and allow us to use "0.0"
         # as a value for disabling the automatic flush timer as well.
         self._flush_interval = flush_interval
+        self._flush_thread = None
         self._flush_thread_stop = threading.Event()
         self._start_flush_thread(self._flush_interval)
 
+    @property
+    def namespace(self):
+        return self._namespace
+
+    @namespace.setter
+    def namespace(self, namespace):
+        self._namespace = namespace
+        # Precomputed so the serializer doesn't need to branch on the namespace
+        self._namespace_prefix = (namespace + ".") if namespace else ""
+
+    @property
+    def default_sample_rate(self):
+        return self._default_sample_rate
+
+    @default_sample_rate.setter
+    def default_sample_rate(self, default_sample_rate):
+        self._default_sample_rate = default_sample_rate
+        self._always_send_default = default_sample_rate == 1
+        # Precomputed so the default sample rate isn't stringified on every metric
+        self._default_sample_rate_suffix = (
+            ("|@" + text(default_sample_rate)) if default_sample_rate != 1 else ""
+        )
+
+    @property
+    def constant_tags(self):
+        return self._constant_tags
+
+    @constant_tags.setter
+    def constant_tags(self, constant_tags):
+        if constant_tags is not None:
+            constant_tags = _ConstantTags(constant_tags, self._refresh_constant_tags)
+        self._constant_tags = constant_tags
+        self._refresh_constant_tags()
+
+    def _refresh_constant_tags(self):
+        constant_tags = self._constant_tags
+        # Constant tags are normalized and joined once here instead of on
+        # every metric
+        self._constant_tags_joined = ",".join(_normalize_tags(constant_tags)) if constant_tags else ""
+        # Events, service checks and telemetry use the constant tags as is
+        self._raw_constant_tags_joined = ",".join(constant_tags) if constant_tags else ""
+        self._update_tag_suffixes()
+        # Telemetry metrics all share the client and constant tags
+        self._telemetry_suffix = "|c|#" + self._joined_tags(self._client_tags) + "\n"
+
+    @property
+    def _container_id(self):
+        return self._container_id_value
+
+    @_container_id.setter
+    def _container_id(self, container_id):
+        self._container_id_value = container_id
+        # Precomputed so the serializer doesn't need to branch on the container ID
+        self._container_suffix = ("|c:" + container_id) if container_id else ""
+        self._update_tag_suffixes()
+
+    def _update_tag_suffixes(self):
+        # The part of a metric or event packet following its own tags only
+        # depends on the constant tags and the container ID, so it's built
+        # once for packets with and without tags.
+        if self._constant_tags_joined:
+            self._tagged_metric_suffix = "," + self._constant_tags_joined + self._container_suffix
+            self._untagged_metric_suffix = "|#" + self._constant_tags_joined + self._container_suffix
+        else:
+            self._tagged_metric_suffix = self._untagged_metric_suffix = self._container_suffix
+        if self._raw_constant_tags_joined:
+            self._tagged_event_suffix = "," + self._raw_constant_tags_joined + self._container_suffix
+            self._untagged_event_suffix = "|#" + self._raw_constant_tags_joined + self._container_suffix
+        else:
+            self._tagged_event_suffix = self._untagged_event_suffix = self._container_suffix
+
     def disable_telemetry(self):
         self._telemetry = False
 
@@ -384,7 +643,8 @@ class DogStatsd(object):
 
     # Note: Invocations of this method should be thread-safe
     def _start_flush_thread(self, flush_interval):
-        if self._disable_buffering or self._flush_interval <= MIN_FLUSH_INTERVAL:
+        # Aggregated metrics rely on the flush thread even when buffering is disabled
+        if (self._disable_buffering and not self._aggregation) or self._flush_interval <= MIN_FLUSH_INTERVAL:
             log.debug("Statsd periodic buffer flush is disabled")
             return
 
@@ -454,11 +714,13 @@ class DogStatsd(object):
             # otherwise start up the flushing thread and enable the buffering.
             if is_disabled:
                 self._send = self._send_to_server
-                self._stop_flush_thread()
+                if not self._aggregation:
+                    self._stop_flush_thread()
                 log.debug("Statsd buffering is disabled")
             else:
                 self._send = self._send_to_buffer
-                self._start_flush_thread(self._flush_interval)
+                if not self._flush_thread:
+                    self._start_flush_thread(self._flush_interval)
 
     @staticmethod
     def resolve_host(host, use_default_route):
@@ -488,22 +750,25 @@ class DogStatsd(object):
                     if self.telemetry_socket_path is not None:
                         self.telemetry_socket = self._get_uds_socket(
                             self.telemetry_socket_path,
+                            self._socket_sndbuf,
                         )
                     else:
                         self.telemetry_socket = self._get_udp_socket(
                             self.telemetry_host,
                             self.telemetry_port,
+                            self._socket_sndbuf,
                         )
 
                 return self.telemetry_socket
 
             if not self.socket:
                 if self.socket_path is not None:
-                    self.socket = self._get_uds_socket(self.socket_path)
+                    self.socket = self._get_uds_socket(self.socket_path, self._socket_sndbuf)
                 else:
                     self.socket = self._get_udp_socket(
                         self.host,
                         self.port,
+                        self._socket_sndbuf,
                     )
 
             return self.socket
@@ -522,18 +787,51 @@ class DogStatsd(object):
                 pass
 
     @classmethod
-    def _get_uds_socket(cls, socket_path):
+    def _ensure_send_buffer_size(cls, sock, sizes=UDP_SEND_BUFFER_SIZES):
+        # Try to raise the send buffer size to the largest of `sizes` accepted
+        # by the platform
+        if os.name != 'posix':
+            return
+        send_buff_size = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        for size in sizes:
+            if send_buff_size >= size:
+                return
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+            except socket.error:
+                continue
+            log.debug(
+                "Socket send buffer increased to %dkb",
+                sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) / 1024,
+            )
+            return
+
+    @classmethod
+    def _set_send_buffer_size(cls, sock, size):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+        except socket.error as e:
+            log.warning("Couldn't set the socket send buffer size to %d: %s", size, e)
+
+    @classmethod
+    def _get_uds_socket(cls, socket_path, sndbuf=None):
         sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
         sock.setblocking(0)
-        cls._ensure_min_send_buffer_size(sock)
+        if sndbuf:
+            cls._set_send_buffer_size(sock, sndbuf)
+        else:
+            cls._ensure_min_send_buffer_size(sock)
         sock.connect(socket_path)
         return sock
 
     @classmethod
-    def _get_udp_socket(cls, host, port):
+    def _get_udp_socket(cls, host, port, sndbuf=None):
         sock = socket.socket(addressfamily(host, port), socket.SOCK_DGRAM)
         sock.setblocking(0)
-        cls._ensure_min_send_buffer_size(sock)
+        if sndbuf:
+            cls._set_send_buffer_size(sock, sndbuf)
+        else:
+            cls._ensure_send_buffer_size(sock)
         sock.connect((host, port))
 
         return sock
@@ -579,18 +877,72 @@ class DogStatsd(object):
 
     def _reset_buffer(self):
         with self._buffer_lock:
-            self._current_buffer_total_size = 0
-            self._buffer = []
+            self._buffer = []  # type: List[bytes]
+            self._buffer_size = 0
 
     def flush(self):
         """
         Flush the metrics buffer by sending the data to the server.
         """
         with self._buffer_lock:
+            payloads = []  # type: List[bytes]
+            if self._aggregation:
+                self._flush_aggregated_metrics(payloads)
+
+            # Only drain what is queued now so that concurrent producers can't
+            # keep the flush going forever. Flushes being serialized by the
+            # lock, the queue holds at least that many metrics.
+            self._queued_size = 0
+            popleft = self._queue.popleft
+            for _ in range(len(self._queue)):
+                self._pack(popleft(), payloads)
+
             # Only send packets if there are packets to send
             if self._buffer:
-                self._send_to_server("\n".join(self._buffer))
-                self._reset_buffer()
+                payloads.append(b"".join(self._buffer))
+                self._buffer = []
+                self._buffer_size = 0
+
+            if payloads:
+                self._send_payloads_to_server(payloads)
+
+    def _pack(self, payload, payloads):
+        """
+        Append an encoded, line-terminated metric to the packet being
+        assembled, moving that packet to `payloads` first if the metric doesn't
+        fit in it anymore.
+
+        Note: must be called while holding `_buffer_lock`.
+        """
+        if self._buffer and self._should_flush(len(payload)):
+            # Joining the packet once is much cheaper than having the kernel
+            # gather one buffer per metric
+            payloads.append(b"".join(self._buffer))
+            self._buffer = []
+            self._buffer_size = 0
+
+        self._buffer.append(payload)
+        self._buffer_size += len(payload)
+
+    def _flush_aggregated_metrics(self, payloads):
+        """
+        Serialize the aggregated counters and gauges into packets.
+
+        Note: must be called while holding `_buffer_lock`.
+        """
+        for metric_type, aggregated in (("c", self._agg_counters), ("g", self._agg_gauges)):
+            for (metric, tags, sample_rate_suffix), value in aggregated.items():
+                payload = self._serialize_metric(metric, metric_type, value, tags, sample_rate_suffix)
+                self._pack((payload + "\n").encode(self.encoding), payloads)
+            aggregated.clear()
+
+    def _aggregate(self, metric, metric_type, value, tags, sample_rate_suffix):
+        key = (metric, tuple(tags) if tags else None, sample_rate_suffix)
+        with self._buffer_lock:
+            if metric_type == "c":
+                self._agg_counters[key] = self._agg_counters.get(key, 0) + value
+            else:
+                self._agg_gauges[key] = value
 
     def gauge(
         self,
@@ -606,6 +958,8 @@ class DogStatsd(object):
         >>> statsd.gauge("users.online", 123)
         >>> statsd.gauge("active.connections", 1001, tags=["protocol:http"])
         """
+        if not self._enabled:
+            return
         return self._report(metric, "g", value, tags, sample_rate)
 
     def increment(
@@ -622,6 +976,8 @@ class DogStatsd(object):
         >>> statsd.increment("page.views")
         >>> statsd.increment("files.transferred", 124)
         """
+        if not self._enabled:
+            return
         self._report(metric, "c", value, tags, sample_rate)
 
     def decrement(
@@ -638,6 +994,8 @@ class DogStatsd(object):
         >>> statsd.decrement("files.remaining")
         >>> statsd.decrement("active.connections", 2)
         """
+        if not self._enabled:
+            return
         metric_value = -value if value else value
         self._report(metric, "c", metric_value, tags, sample_rate)
 
@@ -654,6 +1012,8 @@ class DogStatsd(object):
         >>> statsd.histogram("uploaded.file.size", 1445)
         >>> statsd.histogram("album.photo.count", 26, tags=["gender:female"])
         """
+        if not self._enabled:
+            return
         self._report(metric, "h", value, tags, sample_rate)
 
     def distribution(
@@ -669,6 +1029,8 @@ class DogStatsd(object):
         >>> statsd.distribution("uploaded.file.size", 1445)
         >>> statsd.distribution("album.photo.count", 26, tags=["gender:female"])
         """
+        if not self._enabled:
+            return
         self._report(metric, "d", value, tags, sample_rate)
 
     def timing(
@@ -683,6 +1045,8 @@ class DogStatsd(object):
 
         >>> statsd.timing("query.response.time", 1234)
         """
+        if not self._enabled:
+            return
         self._report(metric, "ms", value, tags, sample_rate)
 
     def timed(self, metric=None, tags=None, sample_rate=None, use_ms=None):
@@ -747,6 +1111,8 @@ class DogStatsd(object):
 
         >>> statsd.set("visitors.uniques", 999)
         """
+        if not self._enabled:
+            return
         self._report(metric, "s", value, tags, sample_rate)
 
     def close_socket(self):
@@ -768,42 +1134,68 @@ class DogStatsd(object):
                     log.error("Unexpected error: %s", str(e))
                 self.telemetry_socket = None
 
-    def _serialize_metric(self, metric, metric_type, value, tags, sample_rate=1):
-        # Create/format the metric packet
-        return "%s%s:%s|%s%s%s%s" % (
-            (self.namespace + ".") if self.namespace else "",
-            metric,
-            value,
-            metric_type,
-            ("|@" + text(sample_rate)) if sample_rate != 1 else "",
-            ("|#" + ",".join(normalize_tags(tags))) if tags else "",
-            ("|c:" + self._container_id if self._container_id else "")
-        )
-
-    def _report(self, metric, metric_type, value, tags, sample_rate):
+    def _serialize_metric(
+        self, metric, metric_type, value, tags, sample_rate_suffix="", _text=text, _normalize_tags=_normalize_tags
+    ):
+        # Create/format the metric packet.
+        # Note: the packet is built as text and encoded once when it's sent.
+        # Assembling it from pre-encoded bytes means encoding every dynamic
+        # part separately, which is about twice slower on CPython.
+        # `_text` and `_normalize_tags` are bound as locals to skip global lookups.
+        if tags:
+            # The same tag lists tend to be reported over and over. This is
+            # the only cache of their normalized form: the LRU cache of
+            # `normalize_tags` would only save the normalization, not the
+            # join, at twice the lookup cost.
+            key = tuple(tags)
+            joined_tags = self._tag_cache.get(key)
+            if joined_tags is None:
+                joined_tags = ",".join(_normalize_tags(key))
+                if len(self._tag_cache) >= MAX_TAG_CACHE_SIZE:
+                    self._tag_cache.clear()
+                self._tag_cache[key] = joined_tags
+            return "".join((
+                self._namespace_prefix, metric, ":", _text(value), "|", metric_type, sample_rate_suffix,
+                "|#", joined_tags, self._tagged_metric_suffix,
+            ))
+        return "".join((
+            self._namespace_prefix, metric, ":", _text(value), "|", metric_type, sample_rate_suffix,
+            self._untagged_metric_suffix,
+        ))
+
+    def _report(self, metric, metric_type, value, tags, sample_rate, _text=text):
         """
         Create a metric packet and send it.
 
         More information about the packets' format: http://docs.datadoghq.com/guides/dogstatsd/
+
+        Note: `_text` is bound at definition time so that the hot path reads it
+        as a local instead of looking up a module global.
         """
         if value is None:
             return
 
-        if self._enabled is not True:
-            return
-
         if self._telemetry:
             self.metrics_count += 1
 
         if sample_rate is None:
-            sample_rate = self.default_sample_rate
+            # Metrics without sampling skip the random draw entirely
+            if not self._always_send_default and random() > self._default_sample_rate:
+                return
+            sample_rate_suffix = self._default_sample_rate_suffix
+        elif sample_rate != 1:
+            if random() > sample_rate:
+                return
+            sample_rate_suffix = "|@" + _text(sample_rate)
+        else:
+            sample_rate_suffix = ""
 
-        if sample_rate != 1 and random() > sample_rate:
+        # Histograms, distributions, timings and sets need per-sample fidelity
+        if self._aggregation and metric_type in ("c", "g"):
+            self._aggregate(metric, metric_type, value, tags, sample_rate_suffix)
             return
 
-        # Resolve the full tag list
-        tags = self._add_constant_tags(tags)
-        payload = self._serialize_metric(metric, metric_type, value, tags, sample_rate)
+        payload = self._serialize_metric(metric, metric_type, value, tags, sample_rate_suffix)
 
         # Send it
         self._send(payload)
@@ -816,47 +1208,54 @@ class DogStatsd(object):
         self.bytes_dropped = 0
         self.packets_sent = 0
         self.packets_dropped = 0
-        self._last_flush_time = time.time()
+        self._next_flush_deadline = monotonic() + self._telemetry_flush_interval
 
     def _flush_telemetry(self):
-        telemetry_tags = ",".join(self._add_constant_tags(self._client_tags))
-
-        return TELEMETRY_FORMATTING_STR % (
-            self.metrics_count,
-            telemetry_tags,
-            self.events_count,
-            telemetry_tags,
-            self.service_checks_count,
-            telemetry_tags,
-            self.bytes_sent,
-            telemetry_tags,
-            self.bytes_dropped,
-            telemetry_tags,
-            self.packets_sent,
-            telemetry_tags,
-            self.packets_dropped,
-            telemetry_tags,
-        )
-
-    def _is_telemetry_flush_time(self):
-        return self._telemetry and \
-            self._last_flush_time + self._telemetry_flush_interval < time.time()
+        suffix = self._telemetry_suffix
+        return "".join((
+            "datadog.dogstatsd.client.metrics:", text(self.metrics_count), suffix,
+            "datadog.dogstatsd.client.events:", text(self.events_count), suffix,
+            "datadog.dogstatsd.client.service_checks:", text(self.service_checks_count), suffix,
+            "datadog.dogstatsd.client.bytes_sent:", text(self.bytes_sent), suffix,
+            "datadog.dogstatsd.client.bytes_dropped:", text(self.bytes_dropped), suffix,
+            "datadog.dogstatsd.client.packets_sent:", text(self.packets_sent), suffix,
+            "datadog.dogstatsd.client.packets_dropped:", text(self.packets_dropped), suffix,
+        ))
 
     def _send_to_server(self, packet):
-        self._xmit_packet(packet + '\n', False)
-        if self._is_telemetry_flush_time():
-            telemetry = self._flush_telemetry()
-            if self._xmit_packet(telemetry, True):
-                self._reset_telemetry()
-                self.packets_sent += 1
-                self.bytes_sent += len(telemetry)
-            else:
-                # Telemetry packet has been dropped, keep telemetry data for the next flush
-                self._last_flush_time = time.time()
-                self.bytes_dropped += len(telemetry)
-                self.packets_dropped += 1
+        # Packets are encoded once, together with their line break, unless
+        # they are already bytes
+        if isinstance(packet, bytes):
+            payload = packet + b"\n"
+        else:
+            payload = (packet + "\n").encode(self.encoding)
+        self._xmit_packet(payload, False)
+        # The deadline is only recomputed when telemetry is flushed, so the
+        # common case costs a single clock read
+        if self._telemetry and monotonic() >= self._next_flush_deadline:
+            self._send_telemetry()
+
+    def _send_payloads_to_server(self, payloads):
+        self._xmit_packets(payloads)
+        if self._telemetry and monotonic() >= self._next_flush_deadline:
+            self._send_telemetry()
+
+    def _send_telemetry(self):
+        telemetry = self._flush_telemetry().encode(self.encoding)
+        if self._xmit_packet(telemetry, True):
+            self._reset_telemetry()
+            self.packets_sent += 1
+            self.bytes_sent += len(telemetry)
+        else:
+            # Telemetry packet has been dropped, keep telemetry data for the next flush
+            self._next_flush_deadline = monotonic() + self._telemetry_flush_interval
+            self.bytes_dropped += len(telemetry)
+            self.packets_dropped += 1
 
-    def _xmit_packet(self, packet, is_telemetry):
+    def _xmit_packet(self, payload, is_telemetry):
+        """
+        Send a single encoded payload as a datagram, return whether it was sent.
+        """
         try:
             if is_telemetry and self._dedicated_telemetry_destination():
                 mysocket = self.telemetry_socket or self.get_socket(telemetry=True)
@@ -864,60 +1263,99 @@ class DogStatsd(object):
                 # If set, use socket directly
                 mysocket = self.socket or self.get_socket()
 
-            mysocket.send(packet.encode(self.encoding))
-
+            mysocket.send(payload)
+        except Exception as exc:
+            self._handle_send_error(exc, len(payload))
             if not is_telemetry and self._telemetry:
-                self.packets_sent += 1
-                self.bytes_sent += len(packet)
+                self.bytes_dropped += len(payload)
+                self.packets_dropped += 1
+            return False
 
-            return True
-        except socket.timeout:
+        if not is_telemetry and self._telemetry:
+            self.packets_sent += 1
+            self.bytes_sent += len(payload)
+        return True
+
+    def _xmit_packets(self, payloads):
+        """
+        Send the flushed payloads, each as a separate datagram, and return how
+        many were sent.
+        """
+        sent = 0
+        try:
+            # If set, use socket directly
+            mysocket = self.socket or self.get_socket()
+
+            if len(payloads) > 1 and self._sendmmsg and isinstance(mysocket, socket.socket):
+                # Hand all the datagrams to the kernel in a single system call
+                while sent < len(payloads):
+                    sent += sendmmsg(mysocket, payloads[sent:])
+            else:
+                for payload in payloads:
+                    mysocket.send(payload)
+                    sent += 1
+        except Exception as exc:
+            # Only the payload being sent can have failed
+            size = len(payloads[sent]) if sent < len(payloads) else 0
+            self._handle_send_error(exc, size)
+
+        if self._telemetry:
+            self.packets_sent += sent
+            self.bytes_sent += sum(map(len, payloads[:sent]))
+            if sent < len(payloads):
+                self.packets_dropped += len(payloads) - sent
+                self.bytes_dropped += sum(map(len, payloads[sent:]))
+
+        return sent
+
+    def _handle_send_error(self, exc, size):
+        """
+        Log an error raised while sending a packet of `size` bytes, closing
+        the socket if it can't be used anymore.
+
+        Note: must be called from the `except` block handling `exc`.
+        """
+        if isinstance(exc, socket.timeout):
             # dogstatsd is overflowing, drop the packets (mimics the UDP behaviour)
-            pass
-        except (socket.herror, socket.gaierror) as socket_err:
+            return
+        if isinstance(exc, (socket.herror, socket.gaierror)):
             log.warning(
                 "Error submitting packet: %s, dropping the packet and closing the socket",
-                socket_err,
+                exc,
             )
             self.close_socket()
-        except socket.error as socket_err:
-            if socket_err.errno == errno.EAGAIN:
-                log.debug("Socket send would block: %s, dropping the packet", socket_err)
-            elif socket_err.errno == errno.ENOBUFS:
-                log.debug("Socket buffer full: %s, dropping the packet", socket_err)
-            elif socket_err.errno == errno.EMSGSIZE:
-                log.debug(
-                    "Packet size too big (size: %d): %s, dropping the packet",
-                    len(packet.encode(self.encoding)),
-                    socket_err)
-            else:
+        elif isinstance(exc, socket.error):
+            message = DROPPED_PACKET_ERRORS.get(exc.errno)
+            if message is None:
                 log.warning(
                     "Error submitting packet: %s, dropping the packet and closing the socket",
-                    socket_err,
+                    exc,
                 )
                 self.close_socket()
-        except Exception as exc:
-            print("Unexpected error: %s", exc)
-            log.error("Unexpected error: %s", str(exc))
-
-        if not is_telemetry and self._telemetry:
-            self.bytes_dropped += len(packet)
-            self.packets_dropped += 1
-
-        return False
+            elif exc.errno == errno.EMSGSIZE:
+                log.debug(message, size, exc)
+            else:
+                log.debug(message, exc)
+        else:
+            # Formatted by the logger only if the record is emitted
+            log.exception("Unexpected error: %s", exc)
 
     def _send_to_buffer(self, packet):
-        with self._buffer_lock:
-            if self._should_flush(len(packet)):
-                self.flush()
+        # Each metric is terminated by a line break
+        if isinstance(packet, bytes):
+            payload = packet + b"\n"
+        else:
+            payload = (packet + "\n").encode(self.encoding)
+        # The queued size is only a hint used to send full packets early, it
+        # doesn't need to be exact when several threads are producing metrics
+        if self._queued_size + len(payload) > self._max_queued_size:
+            self.flush()
 
-            self._buffer.append(packet)
-            # Update the current buffer length, including line break to anticipate
-            # the final packet size
-            self._current_buffer_total_size += len(packet) + 1
+        self._queue.append(payload)
+        self._queued_size += len(payload)
 
     def _should_flush(self, length_to_be_added):
-        if self._current_buffer_total_size + length_to_be_added + 1 > self._max_payload_size:
+        if self._buffer_size + length_to_be_added > self._max_payload_size:
             return True
         return False
 
@@ -927,7 +1365,13 @@ class DogStatsd(object):
 
     @staticmethod
     def _escape_service_check_message(string):
-        return string.replace("\n", "\\n").replace("m:", "m\\:")
+        # Most messages need no escaping, and looking a pattern up is cheaper
+        # than a replacement that finds nothing to replace
+        if "\n" in string:
+            string = string.replace("\n", "\\n")
+        if "m:" in string:
+            string = string.replace("m:", "m\\:")
+        return string
 
     def event(
         self,
@@ -948,49 +1392,53 @@ class DogStatsd(object):
         >>> statsd.event("Man down!", "This server needs assistance.")
         >>> statsd.event("Web server restart", "The web server is up", alert_type="success")  # NOQA
         """
+        # Byte strings can only be passed on Python 2, where `text` is `unicode`
+        if not isinstance(title, text):
+            title = text(title, "utf8")
+        if not isinstance(message, text):
+            message = text(message, "utf8")
+
         title = DogStatsd._escape_event_content(title)
         message = DogStatsd._escape_event_content(message)
 
-        # pylint: disable=undefined-variable
-        if not is_p3k():
-            if not isinstance(title, unicode):                                       # noqa: F821
-                title = unicode(DogStatsd._escape_event_content(title), 'utf8')      # noqa: F821
-            if not isinstance(message, unicode):                                     # noqa: F821
-                message = unicode(DogStatsd._escape_event_content(message), 'utf8')  # noqa: F821
-
-        # Append all client level tags to every event
-        tags = self._add_constant_tags(tags)
-
-        string = u"_e{{{},{}}}:{}|{}".format(
-            len(title.encode('utf8', 'replace')),
-            len(message.encode('utf8', 'replace')),
-            title,
-            message,
-        )
+        # Title and message are encoded once, for both their lengths and the
+        # payload; the optional fields are collected and encoded together.
+        encoded_title = title.encode(self.encoding, "replace")
+        encoded_message = message.encode(self.encoding, "replace")
+        # Title and message alone can be enough to exceed the size limit, in
+        # which case there is no need to build the payload
+        if len(encoded_title) + len(encoded_message) + MIN_EVENT_OVERHEAD > MAX_EVENT_SIZE:
+            raise ValueError(u'Event "{0}" payload is too big (>=8KB). Event discarded'.format(title))
 
+        fields = []
         if date_happened:
-            string = "%s|d:%d" % (string, date_happened)
+            fields.append("|d:%d" % date_happened)
         if hostname:
-            string = "%s|h:%s" % (string, hostname)
+            fields.append("|h:%s" % hostname)
         if aggregation_key:
-            string = "%s|k:%s" % (string, aggregation_key)
+            fields.append("|k:%s" % aggregation_key)
         if priority:
-            string = "%s|p:%s" % (string, priority)
+            fields.append("|p:%s" % priority)
         if source_type_name:
-            string = "%s|s:%s" % (string, source_type_name)
+            fields.append("|s:%s" % source_type_name)
         if alert_type:
-            string = "%s|t:%s" % (string, alert_type)
+            fields.append("|t:%s" % alert_type)
+        # Client level tags and the container ID are appended to every event
         if tags:
-            string = "%s|#%s" % (string, ",".join(tags))
-        if self._container_id:
-            string = "%s|c:%s" % (string, self._container_id)
-
-        if len(string) > 8 * 1024:
-            raise ValueError(
-                u'Event "{0}" payload is too big (>=8KB). Event discarded'.format(
-                    title
-                )
-            )
+            fields += ("|#", ",".join(tags), self._tagged_event_suffix)
+        else:
+            fields.append(self._untagged_event_suffix)
+
+        string = b"".join((
+            b"_e{%d,%d}:" % (len(encoded_title), len(encoded_message)),
+            encoded_title,
+            b"|",
+            encoded_message,
+            u"".join(fields).encode(self.encoding),
+        ))
+
+        if len(string) > MAX_EVENT_SIZE:
+            raise ValueError(u'Event "{0}" payload is too big (>=8KB). Event discarded'.format(title))
 
         if self._telemetry:
             self.events_count += 1
@@ -1013,34 +1461,36 @@ class DogStatsd(object):
         """
         message = DogStatsd._escape_service_check_message(message) if message is not None else ""
 
-        string = u"_sc|{0}|{1}".format(check_name, status)
-
         # Append all client level tags to every status check
-        tags = self._add_constant_tags(tags)
+        tags = self._joined_tags(tags)
 
+        fields = [u"_sc|%s|%s" % (check_name, status)]
         if timestamp:
-            string = u"{0}|d:{1}".format(string, timestamp)
+            fields.append("|d:%s" % timestamp)
         if hostname:
-            string = u"{0}|h:{1}".format(string, hostname)
+            fields.append("|h:%s" % hostname)
         if tags:
-            string = u"{0}|#{1}".format(string, ",".join(tags))
+            fields += ("|#", tags)
         if message:
-            string = u"{0}|m:{1}".format(string, message)
-        if self._container_id:
-            string = u"{0}|c:{1}".format(string, self._container_id)
+            fields += ("|m:", message)
+        fields.append(self._container_suffix)
+        string = u"".join(fields)
 
         if self._telemetry:
             self.service_checks_count += 1
 
         self._send(string)
 
-    def _add_constant_tags(self, tags):
-        if self.constant_tags:
-            if tags:
-                return tags + self.constant_tags
-
-            return self.constant_tags
-        return tags
+    def _joined_tags(self, tags):
+        """
+        Return the given tags and the constant tags as a single string, the
+        constant tags being joined once when they are set.
+        """
+        if not tags:
+            return self._raw_constant_tags_joined
+        if self._raw_constant_tags_joined:
+            return ",".join(tags) + "," + self._raw_constant_tags_joined
+        return ",".join(tags)
 
     def _is_origin_detection_enabled(self, container_id, origin_detection_enabled, has_entity_id):
         """
@@ -1057,7 +1507,7 @@ class DogStatsd(object):
             # or a user-defined container ID was provided
             return False
         value = os.environ.get(ORIGIN_DETECTION_ENABLED, "")
-        return value.lower() not in {"no", "false", "0", "n", "off"}
+        return value.lower() not in ORIGIN_DETECTION_DISABLED_VALUES
 
     def _set_container_id(self, container_id, origin_detection_enabled):
         """
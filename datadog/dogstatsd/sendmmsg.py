@@ -0,0 +1,113 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Helper(s), send several datagrams through a connected socket with a single
+`sendmmsg(2)` system call (Linux only).
+"""
+# stdlib
+import ctypes
+import os
+import socket
+import sys
+import threading
+
+# Maximum number of datagrams handed to the kernel in a single call, the
+# gain of larger batches is marginal
+SENDMMSG_MAX_BATCH = 100
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", _MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+def _load_sendmmsg():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        # Resolve the symbol from the already loaded C library (glibc or
+        # musl), `ctypes.util.find_library` would spawn `ldconfig` on import
+        func = ctypes.CDLL(None, use_errno=True).sendmmsg
+    except (AttributeError, OSError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    func.restype = ctypes.c_int
+    return func
+
+
+_sendmmsg = _load_sendmmsg()
+
+# Message headers and their single iovec are reused across calls, one array
+# of each per thread
+_local = threading.local()
+
+
+def is_sendmmsg_supported():
+    """
+    Return whether `sendmmsg(2)` is available on this platform.
+    """
+    return _sendmmsg is not None
+
+
+def sendmmsg(sock, packets):
+    """
+    Send each of the `packets`, byte strings, as its own datagram through the
+    connected socket `sock`, handing all of them to the kernel in one system
+    call.
+
+    Returns:
+        int: the number of packets that were sent, which may be lower than
+        `len(packets)` if the socket would block or if there are more than
+        `SENDMMSG_MAX_BATCH` of them
+
+    Raises:
+        `NotImplementedError`: `sendmmsg(2)` is not available (non-Linux systems)
+        `socket.error`: no packet could be sent
+    """
+    if _sendmmsg is None:
+        raise NotImplementedError(u"`sendmmsg` is available on Linux only.")
+
+    msgs = getattr(_local, "msgs", None)
+    if msgs is None:
+        msgs = _local.msgs = (_MMsgHdr * SENDMMSG_MAX_BATCH)()
+        iovecs = _local.iovecs = (_IOVec * SENDMMSG_MAX_BATCH)()
+        for i in range(SENDMMSG_MAX_BATCH):
+            msgs[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+            msgs[i].msg_hdr.msg_iovlen = 1
+    else:
+        iovecs = _local.iovecs
+
+    count = min(len(packets), SENDMMSG_MAX_BATCH)
+    for i, packet in enumerate(packets[:count]):
+        # Only the address of the packet is stored: the reused iovecs must not
+        # keep the packets alive once the call returns, `packets` does until then
+        iovecs[i].iov_base = ctypes.cast(packet, ctypes.c_void_p).value
+        iovecs[i].iov_len = len(packet)
+
+    sent = _sendmmsg(sock.fileno(), msgs, count, 0)
+    if sent < 0:
+        err = ctypes.get_errno()
+        raise socket.error(err, os.strerror(err))
+    return sent
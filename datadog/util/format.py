@@ -31,9 +31,13 @@ def force_to_epoch_seconds(epoch_sec_or_dt):
     return epoch_sec_or_dt
 
 
+def _normalize_tags(tag_list):
+    return [TAG_INVALID_CHARS_RE.sub(TAG_INVALID_CHARS_SUBS, tag) for tag in tag_list]
+
+
 @conditional_lru_cache
 def _normalize_tags_with_cache(tag_list):
-    return [TAG_INVALID_CHARS_RE.sub(TAG_INVALID_CHARS_SUBS, tag) for tag in tag_list]
+    return _normalize_tags(tag_list)
 
 
 def normalize_tags(tag_list):
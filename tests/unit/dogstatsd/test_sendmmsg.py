@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Tests for sendmmsg.py
+"""
+from contextlib import closing
+import socket
+import subprocess
+import sys
+
+import mock
+import pytest
+
+from datadog.dogstatsd import sendmmsg as sendmmsg_module
+from datadog.dogstatsd.sendmmsg import SENDMMSG_MAX_BATCH, is_sendmmsg_supported, sendmmsg
+
+
+@pytest.mark.skipif(not is_sendmmsg_supported(), reason="sendmmsg is available on Linux only")
+def test_sendmmsg_sends_one_datagram_per_packet():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    with closing(listener), closing(sender):
+        listener.bind(("localhost", 0))
+        listener.settimeout(1)
+        sender.connect(listener.getsockname())
+
+        packets = [b"gauge1:1|g\ngauge2:2|g\n", b"gauge3:3|g\n"]
+        assert sendmmsg(sender, packets) == len(packets)
+
+        assert [listener.recv(1024) for _ in packets] == [b"gauge1:1|g\ngauge2:2|g\n", b"gauge3:3|g\n"]
+
+
+@pytest.mark.skipif(not is_sendmmsg_supported(), reason="sendmmsg is available on Linux only")
+def test_sendmmsg_caps_batch_size():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    with closing(listener), closing(sender):
+        listener.bind(("localhost", 0))
+        sender.connect(listener.getsockname())
+
+        packets = [b"gauge:1|g\n"] * (SENDMMSG_MAX_BATCH + 1)
+        assert sendmmsg(sender, packets) == SENDMMSG_MAX_BATCH
+        assert sendmmsg(sender, packets[SENDMMSG_MAX_BATCH:]) == 1
+
+
+@pytest.mark.skipif(not is_sendmmsg_supported(), reason="sendmmsg is available on Linux only")
+def test_sendmmsg_does_not_keep_packets_alive():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    with closing(listener), closing(sender):
+        listener.bind(("localhost", 0))
+        sender.connect(listener.getsockname())
+
+        packet = b"gauge:" + b"1" * 100 + b"|g\n"
+        refcount = sys.getrefcount(packet)
+        assert sendmmsg(sender, [packet]) == 1
+        assert sys.getrefcount(packet) == refcount
+
+
+@pytest.mark.skipif(is_sendmmsg_supported(), reason="sendmmsg is supported on this platform")
+def test_sendmmsg_not_supported():
+    with pytest.raises(NotImplementedError):
+        sendmmsg(None, [b"gauge:1|g\n"])
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="sendmmsg is available on Linux only")
+def test_sendmmsg_is_loaded_without_subprocess():
+    with mock.patch.object(subprocess, "Popen") as mock_popen:
+        assert sendmmsg_module._load_sendmmsg() is not None
+    mock_popen.assert_not_called()
@@ -11,8 +11,10 @@ Tests for dogstatsd.py
 from collections import deque
 from contextlib import closing
 from threading import Thread
+import copy
 import errno
 import os
+import pickle
 import shutil
 import socket
 import tempfile
@@ -21,6 +23,11 @@ import time
 import unittest
 import warnings
 
+try:
+    from time import monotonic  # type: ignore[attr-defined]
+except ImportError:
+    from time import time as monotonic
+
 # Third-party libraries
 import mock
 from mock import call, Mock, mock_open, patch
@@ -29,9 +36,10 @@ import pytest
 # Datadog libraries
 from datadog import initialize, statsd
 from datadog import __version__ as version
-from datadog.dogstatsd.base import DEFAULT_FLUSH_INTERVAL, DogStatsd, MIN_SEND_BUFFER_SIZE, UDP_OPTIMAL_PAYLOAD_LENGTH, UDS_OPTIMAL_PAYLOAD_LENGTH
+from datadog.dogstatsd.base import DEFAULT_FLUSH_INTERVAL, DogStatsd, addressfamily, MAX_TAG_CACHE_SIZE, MIN_SEND_BUFFER_SIZE, UDP_OPTIMAL_PAYLOAD_LENGTH, UDP_SEND_BUFFER_SIZES, UDS_OPTIMAL_PAYLOAD_LENGTH
 from datadog.dogstatsd.context import TimedContextManagerDecorator
-from datadog.util.compat import is_higher_py35, is_p3k
+from datadog.dogstatsd.sendmmsg import is_sendmmsg_supported, sendmmsg
+from datadog.util.compat import is_higher_py32, is_higher_py35, is_p3k
 from tests.util.contextmanagers import preserve_environment_variable, EnvVars
 from tests.unit.dogstatsd.fixtures import load_fixtures
 
@@ -140,7 +148,7 @@ class TestDogStatsd(unittest.TestCase):
 
     def assert_equal_telemetry(self, expected_payload, actual_payload, telemetry=None):
         if telemetry is None:
-            telemetry = telemetry_metrics(bytes_sent=len(expected_payload))
+            telemetry = telemetry_metrics(bytes_sent=len(expected_payload.encode('utf-8')))
 
         if expected_payload:
             expected_payload = "\n".join([expected_payload, telemetry])
@@ -404,7 +412,7 @@ class TestDogStatsd(unittest.TestCase):
             telemetry=telemetry_metrics(
                 metrics=0,
                 events=1,
-                bytes_sent=len(event2),
+                bytes_sent=len(event2.encode('utf-8')),
             ),
         )
 
@@ -419,7 +427,7 @@ class TestDogStatsd(unittest.TestCase):
             telemetry=telemetry_metrics(
                 metrics=0,
                 events=1,
-                bytes_sent=len(event3),
+                bytes_sent=len(event3.encode('utf-8')),
             ),
         )
 
@@ -435,7 +443,7 @@ class TestDogStatsd(unittest.TestCase):
             telemetry=telemetry_metrics(
                 metrics=0,
                 events=1,
-                bytes_sent=len(event),
+                bytes_sent=len(event.encode('utf-8')),
             ),
         )
 
@@ -451,7 +459,7 @@ class TestDogStatsd(unittest.TestCase):
             telemetry=telemetry_metrics(
                 metrics=0,
                 events=1,
-                bytes_sent=len(event),
+                bytes_sent=len(event.encode('utf-8')),
             ),
         )
 
@@ -468,7 +476,7 @@ class TestDogStatsd(unittest.TestCase):
                 metrics=0,
                 events=1,
                 tags="bar:baz,foo",
-                bytes_sent=len(event),
+                bytes_sent=len(event.encode('utf-8')),
             ),
         )
 
@@ -484,7 +492,7 @@ class TestDogStatsd(unittest.TestCase):
                 metrics=0,
                 events=1,
                 tags="bar:baz,foo",
-                bytes_sent=len(event),
+                bytes_sent=len(event.encode('utf-8')),
             ),
         )
 
@@ -504,6 +512,15 @@ class TestDogStatsd(unittest.TestCase):
         # check that the method does not fail with a small payload
         self.statsd.event("title", "message")
 
+    def test_event_payload_size_is_counted_in_bytes(self):
+        # 3000 characters but 6000 bytes, along with tags that push the
+        # payload over the limit once built
+        message = u"é" * 3000
+        with pytest.raises(ValueError):
+            self.statsd.event("title", message, tags=["tag:" + "v" * 2500])
+
+        self.statsd.event("title", message)
+
 
     def test_service_check(self):
         now = int(time.time())
@@ -518,7 +535,7 @@ class TestDogStatsd(unittest.TestCase):
             telemetry=telemetry_metrics(
                 metrics=0,
                 service_checks=1,
-                bytes_sent=len(check),
+                bytes_sent=len(check.encode('utf-8')),
             ),
         )
 
@@ -537,7 +554,7 @@ class TestDogStatsd(unittest.TestCase):
                 metrics=0,
                 service_checks=1,
                 tags="bar:baz,foo",
-                bytes_sent=len(check),
+                bytes_sent=len(check.encode('utf-8')),
             ),
         )
 
@@ -555,7 +572,7 @@ class TestDogStatsd(unittest.TestCase):
                 metrics=0,
                 service_checks=1,
                 tags="bar:baz,foo",
-                bytes_sent=len(check),
+                bytes_sent=len(check.encode('utf-8')),
             ),
         )
 
@@ -574,6 +591,42 @@ class TestDogStatsd(unittest.TestCase):
         metric = 'gauge:123.4|g|#bar:baz,foo\n'
         self.assert_equal_telemetry(metric, self.recv(2), telemetry=telemetry_metrics(tags="bar:baz,foo", bytes_sent=len(metric)))
 
+    def test_gauge_constant_tags_modified_in_place(self):
+        self.statsd.constant_tags = ['bar:baz']
+        self.statsd.constant_tags.append('foo')
+        self.statsd.gauge('gauge', 123.4)
+        metric = 'gauge:123.4|g|#bar:baz,foo\n'
+        self.assert_equal_telemetry(metric, self.recv(2), telemetry=telemetry_metrics(tags="bar:baz,foo", bytes_sent=len(metric)))
+
+        self.statsd._reset_telemetry()
+        self.statsd.constant_tags += ['late:tag']
+        del self.statsd.constant_tags[0]
+        self.statsd.event('Title', 'Text')
+        event = u'_e{5,4}:Title|Text|#foo,late:tag\n'
+        self.assert_equal_telemetry(
+            event,
+            self.recv(2),
+            telemetry=telemetry_metrics(metrics=0, events=1, tags="foo,late:tag", bytes_sent=len(event)),
+        )
+
+    def test_constant_tags_copies_are_plain_lists(self):
+        self.statsd.disable_telemetry()
+        self.statsd.constant_tags = ['bar:baz']
+
+        for tags in (
+            copy.copy(self.statsd.constant_tags),
+            copy.deepcopy(self.statsd.constant_tags),
+            pickle.loads(pickle.dumps(self.statsd.constant_tags)),
+        ):
+            self.assertIs(list, type(tags))
+            self.assertEqual(['bar:baz'], tags)
+            # Changing a copy doesn't affect the client
+            tags.append('foo')
+            self.assertEqual(['bar:baz'], self.statsd.constant_tags)
+
+        self.statsd.gauge('gauge', 123.4)
+        self.assertEqual('gauge:123.4|g|#bar:baz\n', self.recv())
+
     def test_counter_constant_tag_with_metric_level_tags(self):
         self.statsd.constant_tags = ['bar:baz', 'foo']
         self.statsd.increment('page.views', tags=['extra'])
@@ -621,6 +674,17 @@ class TestDogStatsd(unittest.TestCase):
                 mock.ANY,
             )
 
+    def test_socket_unexpected_error(self):
+        mock_socket = Mock()
+        mock_socket.send.side_effect = ValueError("unexpected")
+        self.statsd.socket = mock_socket
+        with mock.patch("datadog.dogstatsd.base.log") as mock_log, \
+                mock.patch("sys.stdout") as mock_stdout:
+            self.statsd.gauge('no error', 1)
+
+            mock_log.exception.assert_called_with("Unexpected error: %s", mock.ANY)
+            mock_stdout.write.assert_not_called()
+
     def test_socket_overflown(self):
         self.statsd.socket = OverflownSocket()
         with mock.patch("datadog.dogstatsd.base.log") as mock_log:
@@ -694,9 +758,55 @@ class TestDogStatsd(unittest.TestCase):
         mock_socket.setsockopt.assert_called_once_with(
             socket.SOL_SOCKET,
             socket.SO_SNDBUF,
-            MIN_SEND_BUFFER_SIZE,
+            UDP_SEND_BUFFER_SIZES[0],
         )
 
+    @patch('socket.socket')
+    def test_udp_socket_send_buffer_fallback(self, mock_socket_create):
+        mock_socket = mock_socket_create.return_value
+        mock_socket.setblocking.return_value = None
+        mock_socket.connect.return_value = None
+        mock_socket.getsockopt.return_value = MIN_SEND_BUFFER_SIZE / 2
+        # The platform rejects the largest buffer size
+        mock_socket.setsockopt.side_effect = [socket.error(errno.ENOBUFS, "No buffer space available"), None]
+
+        datadog = DogStatsd()
+        datadog.gauge('some value', 1)
+        datadog.flush()
+
+        mock_socket.setsockopt.assert_has_calls([
+            call(socket.SOL_SOCKET, socket.SO_SNDBUF, UDP_SEND_BUFFER_SIZES[0]),
+            call(socket.SOL_SOCKET, socket.SO_SNDBUF, UDP_SEND_BUFFER_SIZES[1]),
+        ])
+        self.assertEqual(mock_socket.setsockopt.call_count, 2)
+
+    @patch('socket.socket')
+    def test_socket_sndbuf_overrides_send_buffer_size(self, mock_socket_create):
+        mock_socket = mock_socket_create.return_value
+        mock_socket.setblocking.return_value = None
+        mock_socket.connect.return_value = None
+
+        for options in ({}, {'socket_path': '/tmp/socket.sock'}):
+            mock_socket.setsockopt.reset_mock()
+            datadog = DogStatsd(socket_sndbuf=4 * 1024 * 1024, **options)
+            datadog.gauge('some value', 1)
+            datadog.flush()
+
+            mock_socket.setsockopt.assert_called_once_with(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+            mock_socket.getsockopt.assert_not_called()
+
+    @pytest.mark.skipif(not is_higher_py32(), reason="LRU cache is only available on Python 3.2+")
+    def test_addressfamily_prefers_ipv4_and_is_cached(self):
+        addrinfo = [
+            (socket.AF_INET6, socket.SOCK_DGRAM, 17, '', ('::1', 8125, 0, 0)),
+            (socket.AF_INET, socket.SOCK_DGRAM, 17, '', ('127.0.0.1', 8125)),
+        ]
+        with patch('socket.getaddrinfo', return_value=addrinfo) as mock_getaddrinfo:
+            self.assertEqual(addressfamily('addressfamily.test', 8125), socket.AF_INET)
+            self.assertEqual(addressfamily('addressfamily.test', 8125), socket.AF_INET)
+
+        mock_getaddrinfo.assert_called_once_with('addressfamily.test', 8125)
+
     def test_distributed(self):
         """
         Measure the distribution of a function's run time using distribution custom metric.
@@ -1270,21 +1380,34 @@ async def print_foo():
         self.assertEqual(1, self.statsd.packets_sent)
         self.assertEqual(0, self.statsd.packets_dropped)
 
+    def test_telemetry_bytes_are_counted_once_encoded(self):
+        dogstatsd = DogStatsd(constant_tags=[u'café:1'], telemetry_min_flush_interval=0)
+        fake_socket = FakeSocket()
+        dogstatsd.socket = fake_socket
+
+        dogstatsd.gauge('gauge', 1)
+        self.assertEqual(2, len(fake_socket.payloads))
+
+        # The telemetry packet accounts for itself once it's been sent
+        telemetry = fake_socket.payloads[1]
+        self.assertEqual(len(telemetry), dogstatsd.bytes_sent)
+        self.assertNotEqual(len(telemetry.decode('utf-8')), dogstatsd.bytes_sent)
+
     def test_telemetry_flush_interval(self):
         dogstatsd = DogStatsd(disable_buffering=False)
         fake_socket = FakeSocket()
         dogstatsd.socket = fake_socket
 
-        # Set the last flush time in the future to be sure we won't flush
-        dogstatsd._last_flush_time = time.time() + dogstatsd._telemetry_flush_interval
+        # Set the next flush deadline in the future to be sure we won't flush
+        dogstatsd._next_flush_deadline = monotonic() + 2 * dogstatsd._telemetry_flush_interval
         dogstatsd.gauge('gauge', 123.4)
 
         metric = 'gauge:123.4|g\n'
         self.assertEqual(metric, fake_socket.recv())
 
-        time1 = time.time()
-        # Setting the last flush time in the past to trigger a telemetry flush
-        dogstatsd._last_flush_time = time1 - dogstatsd._telemetry_flush_interval -1
+        time1 = monotonic()
+        # Setting the next flush deadline in the past to trigger a telemetry flush
+        dogstatsd._next_flush_deadline = time1 - 1
         dogstatsd.gauge('gauge', 123.4)
         self.assert_equal_telemetry(
             metric,
@@ -1296,8 +1419,8 @@ async def print_foo():
             ),
         )
 
-        # assert that _last_flush_time has been updated
-        self.assertTrue(time1 < dogstatsd._last_flush_time)
+        # assert that _next_flush_deadline has been pushed back
+        self.assertTrue(time1 + dogstatsd._telemetry_flush_interval <= dogstatsd._next_flush_deadline)
 
     def test_telemetry_flush_interval_alternate_destination(self):
         dogstatsd = DogStatsd(telemetry_host='foo')
@@ -1310,15 +1433,15 @@ async def print_foo():
         self.assertIsNotNone(dogstatsd.telemetry_port)
         self.assertTrue(dogstatsd._dedicated_telemetry_destination())
 
-        # set the last flush time in the future to be sure we won't flush
-        dogstatsd._last_flush_time = time.time() + dogstatsd._telemetry_flush_interval
+        # set the next flush deadline in the future to be sure we won't flush
+        dogstatsd._next_flush_deadline = monotonic() + 2 * dogstatsd._telemetry_flush_interval
         dogstatsd.gauge('gauge', 123.4)
 
         self.assertEqual('gauge:123.4|g\n', fake_socket.recv())
 
-        time1 = time.time()
-        # setting the last flush time in the past to trigger a telemetry flush
-        dogstatsd._last_flush_time = time1 - dogstatsd._telemetry_flush_interval - 1
+        time1 = monotonic()
+        # setting the next flush deadline in the past to trigger a telemetry flush
+        dogstatsd._next_flush_deadline = time1 - 1
         dogstatsd.gauge('gauge', 123.4)
 
         self.assertEqual('gauge:123.4|g\n', fake_socket.recv(reset_wait=True))
@@ -1332,8 +1455,8 @@ async def print_foo():
             ),
         )
 
-        # assert that _last_flush_time has been updated
-        self.assertTrue(time1 < dogstatsd._last_flush_time)
+        # assert that _next_flush_deadline has been pushed back
+        self.assertTrue(time1 + dogstatsd._telemetry_flush_interval <= dogstatsd._next_flush_deadline)
 
     def test_telemetry_flush_interval_batch(self):
         dogstatsd = DogStatsd(disable_buffering=False)
@@ -1345,16 +1468,16 @@ async def print_foo():
         dogstatsd.gauge('gauge1', 1)
         dogstatsd.gauge('gauge2', 2)
 
-        time1 = time.time()
-        # setting the last flush time in the past to trigger a telemetry flush
-        dogstatsd._last_flush_time = time1 - statsd._telemetry_flush_interval -1
+        time1 = monotonic()
+        # setting the next flush deadline in the past to trigger a telemetry flush
+        dogstatsd._next_flush_deadline = time1 - 1
 
         dogstatsd.close_buffer()
 
         metric = 'gauge1:1|g\ngauge2:2|g\n'
         self.assert_equal_telemetry(metric, fake_socket.recv(2), telemetry=telemetry_metrics(metrics=2, bytes_sent=len(metric)))
-        # assert that _last_flush_time has been updated
-        self.assertTrue(time1 < dogstatsd._last_flush_time)
+        # assert that _next_flush_deadline has been pushed back
+        self.assertTrue(time1 + dogstatsd._telemetry_flush_interval <= dogstatsd._next_flush_deadline)
 
 
     def test_dedicated_udp_telemetry_dest(self):
@@ -1510,16 +1633,21 @@ async def print_foo():
 
             single_metric = 'mycounter:1|c\n'
             metrics_per_packet = dogstatsd._max_payload_size // len(single_metric)
-            for _ in range(metrics_per_packet + 1):
+            # The queue is flushed once it holds a batch worth of packets
+            metrics_per_flush = dogstatsd._max_queued_size // len(single_metric)
+            for _ in range(metrics_per_flush + 1):
                 dogstatsd.increment('mycounter')
-            payload = ''.join([single_metric for _ in range(metrics_per_packet)])
 
+            packets = []
+            for remaining in range(metrics_per_flush, 0, -metrics_per_packet):
+                packets.append(single_metric * min(remaining, metrics_per_packet))
             telemetry = telemetry_metrics(
-                metrics=metrics_per_packet+1,
-                bytes_sent=len(payload),
+                metrics=metrics_per_flush+1,
+                packets_sent=len(packets),
+                bytes_sent=len(''.join(packets)),
             )
-            bytes_sent += len(payload) + len(telemetry)
-            self.assertEqual(payload, fake_socket.recv())
+            for payload in packets:
+                self.assertEqual(payload, fake_socket.recv())
             self.assertEqual(telemetry, fake_socket.recv())
 
         self.assertEqual(single_metric, fake_socket.recv())
@@ -1527,9 +1655,117 @@ async def print_foo():
         telemetry = telemetry_metrics(metrics=0, packets_sent=2, bytes_sent=len(single_metric) + len(telemetry))
         self.assertEqual(telemetry, fake_socket.recv())
 
+    def test_flush_splits_aggregated_metrics_into_packets(self):
+        fake_socket = FakeSocket()
+        dogstatsd = DogStatsd(
+            max_buffer_len=len('counter1:1|c\ncounter2:2|c\n'),
+            disable_aggregation=False,
+            disable_telemetry=True,
+            flush_interval=0,
+        )
+        dogstatsd.socket = fake_socket
+
+        dogstatsd.increment('counter1', 1)
+        dogstatsd.increment('counter2', 2)
+        dogstatsd.increment('counter3', 3)
+        dogstatsd.flush()
+
+        self.assertEqual('counter1:1|c\ncounter2:2|c\n', fake_socket.recv(no_wait=True))
+        self.assertEqual('counter3:3|c\n', fake_socket.recv(no_wait=True))
+        self.assertIsNone(fake_socket.recv(no_wait=True))
+
+    def test_flush_sends_joined_packet(self):
+        mock_socket = Mock()
+        dogstatsd = DogStatsd(telemetry_min_flush_interval=0, disable_telemetry=True, flush_interval=0)
+        dogstatsd.socket = mock_socket
+
+        dogstatsd.open_buffer()
+        dogstatsd.gauge('gauge1', 1)
+        dogstatsd.gauge('gauge2', 2)
+        dogstatsd.close_buffer()
+
+        mock_socket.send.assert_called_once_with(b'gauge1:1|g\ngauge2:2|g\n')
+        mock_socket.sendmsg.assert_not_called()
+
+    @pytest.mark.skipif(not is_sendmmsg_supported(), reason="sendmmsg is available on Linux only")
+    def test_flush_batches_packets_with_sendmmsg(self):
+        listener_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener_sock.bind(('localhost', 0))
+        listener_sock.settimeout(1)
+
+        with closing(listener_sock):
+            dogstatsd = DogStatsd(
+                host="localhost",
+                port=listener_sock.getsockname()[1],
+                max_buffer_len=len('counter1:1|c\n'),
+                disable_aggregation=False,
+                disable_telemetry=True,
+                flush_interval=0,
+            )
+            dogstatsd.increment('counter1', 1)
+            dogstatsd.increment('counter2', 2)
+            with patch('datadog.dogstatsd.base.sendmmsg', wraps=sendmmsg) as mock_sendmmsg:
+                dogstatsd.flush()
+            dogstatsd.close_socket()
+
+            mock_sendmmsg.assert_called_once_with(
+                mock.ANY, [b'counter1:1|c\n', b'counter2:2|c\n'],
+            )
+            self.assertEqual(b'counter1:1|c\n', listener_sock.recv(UDP_OPTIMAL_PAYLOAD_LENGTH))
+            self.assertEqual(b'counter2:2|c\n', listener_sock.recv(UDP_OPTIMAL_PAYLOAD_LENGTH))
+
+    def test_aggregation(self):
+        dogstatsd = DogStatsd(disable_aggregation=False, disable_telemetry=True, flush_interval=0)
+        fake_socket = FakeSocket()
+        dogstatsd.socket = fake_socket
+
+        dogstatsd.increment('page.views')
+        dogstatsd.increment('page.views', 2)
+        dogstatsd.decrement('page.views', tags=['route:home'])
+        dogstatsd.gauge('users.online', 10)
+        dogstatsd.gauge('users.online', 12)
+        dogstatsd.histogram('file.size', 1)
+        dogstatsd.histogram('file.size', 2)
+
+        # Only non-aggregated metrics are sent right away
+        self.assertEqual('file.size:1|h\n', fake_socket.recv(no_wait=True))
+        self.assertEqual('file.size:2|h\n', fake_socket.recv(no_wait=True))
+        self.assertIsNone(fake_socket.recv(no_wait=True))
+
+        dogstatsd.flush()
+        self.assertEqual(
+            'page.views:3|c\npage.views:-1|c|#route:home\nusers.online:12|g\n',
+            fake_socket.recv(no_wait=True),
+        )
+
+        # Aggregated values are reset after a flush
+        dogstatsd.flush()
+        self.assertIsNone(fake_socket.recv(no_wait=True))
+
+    def test_aggregation_keeps_sample_rate(self):
+        dogstatsd = DogStatsd(disable_aggregation=False, disable_telemetry=True, flush_interval=0)
+        fake_socket = FakeSocket()
+        dogstatsd.socket = fake_socket
+
+        with mock.patch('datadog.dogstatsd.base.random', return_value=0):
+            dogstatsd.increment('page.views', sample_rate=0.5)
+            dogstatsd.increment('page.views', sample_rate=0.5)
+        dogstatsd.flush()
+
+        self.assertEqual('page.views:2|c|@0.5\n', fake_socket.recv(no_wait=True))
+
     def test_module_level_instance(self):
         self.assertTrue(isinstance(statsd, DogStatsd))
 
+    def test_instance_attributes_use_slots(self):
+        dogstatsd = DogStatsd(disable_aggregation=False, container_id="fake-container-id", flush_interval=0)
+        self.assertEqual(vars(dogstatsd), {})
+
+        # Instances can still be patched
+        with patch.object(dogstatsd, 'increment') as mock_increment:
+            dogstatsd.increment('page.views')
+        mock_increment.assert_called_once_with('page.views')
+
     def test_instantiating_does_not_connect(self):
         dogpound = DogStatsd()
         self.assertIsNone(dogpound.socket)
@@ -1680,7 +1916,8 @@ async def print_foo():
         dogstatsd = DogStatsd(disable_buffering=False, flush_interval=10000, disable_telemetry=True)
         dogstatsd.socket = FakeSocket()
 
-        for _ in range(10000):
+        # Enough metrics to fill the queue and trigger a flush
+        for _ in range(dogstatsd._max_queued_size // len('val:1|c\n') + 1):
             dogstatsd.increment('val')
 
         payload = dogstatsd.socket.recv()
@@ -1701,7 +1938,8 @@ async def print_foo():
         )
         dogstatsd.socket = FakeSocket()
 
-        for _ in range(10000):
+        # Enough metrics to fill the queue and trigger a flush
+        for _ in range(dogstatsd._max_queued_size // len('val:1|c\n') + 1):
             dogstatsd.increment('val')
 
         payload = dogstatsd.socket.recv()
@@ -1722,7 +1960,8 @@ async def print_foo():
         )
         dogstatsd.socket = FakeSocket()
 
-        for _ in range(10000):
+        # Enough metrics to fill the queue and trigger a flush
+        for _ in range(dogstatsd._max_queued_size // len('val:1|c\n') + 1):
             dogstatsd.increment('val')
 
         payload = dogstatsd.socket.recv()
@@ -1734,6 +1973,23 @@ async def print_foo():
 
             payload = dogstatsd.socket.recv()
 
+    def test_disabled_client_does_not_send(self):
+        with EnvVars(env_vars={'DD_DOGSTATSD_DISABLE': 'true'}):
+            dogstatsd = DogStatsd(telemetry_min_flush_interval=0)
+        fake_socket = FakeSocket()
+        dogstatsd.socket = fake_socket
+
+        dogstatsd.gauge('gauge', 1)
+        dogstatsd.increment('counter')
+        dogstatsd.decrement('counter')
+        dogstatsd.histogram('histogram', 1)
+        dogstatsd.distribution('distribution', 1)
+        dogstatsd.timing('timing', 1)
+        dogstatsd.set('set', 1)
+
+        self.assertIsNone(fake_socket.recv(no_wait=True))
+        self.assertEqual(dogstatsd.metrics_count, 0)
+
     def test_gauge_does_not_send_none(self):
         self.statsd.gauge('metric', None)
         self.assertIsNone(self.recv())
@@ -1760,6 +2016,46 @@ async def print_foo():
         self.assert_equal_telemetry("set:123|s|c:fake-container-id\n", self.recv(2))
         self.statsd._container_id = None
 
+    def test_serialized_tags_cache_is_bounded(self):
+        self.statsd.disable_telemetry()
+        self.statsd.gauge('gauge', 1, tags=['Foo:Bar'])
+        self.statsd.gauge('gauge', 2, tags=('Foo:Bar',))
+        self.assertEqual('gauge:1|g|#Foo:Bar\n', self.recv())
+        self.assertEqual('gauge:2|g|#Foo:Bar\n', self.recv())
+        self.assertEqual({('Foo:Bar',): 'Foo:Bar'}, self.statsd._tag_cache)
+
+        for i in range(MAX_TAG_CACHE_SIZE + 1):
+            self.statsd._serialize_metric('gauge', 'g', 1, ['tag:%d' % i])
+        self.assertLessEqual(len(self.statsd._tag_cache), MAX_TAG_CACHE_SIZE)
+
+    def test_metric_suffix_follows_constant_tags_and_container_field(self):
+        self.statsd.disable_telemetry()
+        self.statsd._container_id = "fake-container-id"
+        self.statsd.constant_tags = ["env:prod"]
+        self.statsd.gauge("gauge", 1)
+        self.statsd.gauge("gauge", 2, tags=["foo:bar"])
+        self.statsd.constant_tags = []
+        self.statsd._container_id = None
+        self.statsd.gauge("gauge", 3)
+
+        self.assertEqual("gauge:1|g|#env:prod|c:fake-container-id\n", self.recv())
+        self.assertEqual("gauge:2|g|#foo:bar,env:prod|c:fake-container-id\n", self.recv())
+        self.assertEqual("gauge:3|g\n", self.recv())
+
+    def test_event_suffix_follows_constant_tags_and_container_field(self):
+        self.statsd.disable_telemetry()
+        self.statsd._container_id = "fake-container-id"
+        self.statsd.constant_tags = ["env:prod"]
+        self.statsd.event("Title", "Text")
+        self.statsd.event("Title", "Text", tags=["foo:bar"])
+        self.statsd.constant_tags = []
+        self.statsd._container_id = None
+        self.statsd.event("Title", "Text")
+
+        self.assertEqual("_e{5,4}:Title|Text|#env:prod|c:fake-container-id\n", self.recv())
+        self.assertEqual("_e{5,4}:Title|Text|#foo:bar,env:prod|c:fake-container-id\n", self.recv())
+        self.assertEqual("_e{5,4}:Title|Text\n", self.recv())
+
     def test_gauge_with_container_field(self):
         self.statsd._container_id = "fake-container-id"
         self.statsd.gauge("gauge", 123.4)
@@ -1817,7 +2113,7 @@ async def print_foo():
             telemetry=telemetry_metrics(
                 metrics=0,
                 events=1,
-                bytes_sent=len(event2),
+                bytes_sent=len(event2.encode('utf-8')),
             ),
         )
 
@@ -1831,7 +2127,7 @@ async def print_foo():
             telemetry=telemetry_metrics(
                 metrics=0,
                 events=1,
-                bytes_sent=len(event3),
+                bytes_sent=len(event3.encode('utf-8')),
             ),
         )
         self.statsd._container_id = None
@@ -1856,7 +2152,7 @@ async def print_foo():
             telemetry=telemetry_metrics(
                 metrics=0,
                 service_checks=1,
-                bytes_sent=len(check),
+                bytes_sent=len(check.encode('utf-8')),
             ),
         )
         self.statsd._container_id = None